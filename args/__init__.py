@@ -1,2 +1,3 @@
+from .base_arg_parser import EVAL_FLAGS, EVAL_FLAG_TO_DATASET
 from .test_arg_parser import TestArgParser
 from .train_arg_parser import TrainArgParser
@@ -1,17 +1,32 @@
 import argparse
 import os
-import uuid
 import time
-import copy
+from collections import defaultdict
 from datetime import datetime
 
 
 import json
-import torch
-import torch.backends.cudnn as cudnn
 
-import util
-from dataset import TASK_SEQUENCES
+from .arg_util import args_to_list, str_to_bool
+
+# Dataset selection flags (in data_args), in order of precedence,
+# and the name of the dataset each flag selects.
+EVAL_FLAGS = ('eval_pocus', 'eval_hocus', 'eval_pulm')
+EVAL_FLAG_TO_DATASET = {
+    'eval_pocus': 'pocus',
+    'eval_hocus': 'hocus',
+    'eval_pulm': 'pulm',
+}
+
+# Task sequences as sets, computed once for the subset checks in are_tasks_missing.
+# The JSON is read directly so that parsing args does not import the dataset package (torch).
+_TASK_SEQUENCES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    'dataset', 'task_sequences.json')
+with open(_TASK_SEQUENCES_PATH) as f:
+    _TASK_SETS = {name: frozenset(seq) for name, seq in json.load(f).items()}
+
+# Sections of a checkpoint's args.json that are copied into the args in test mode
+_CKPT_ARG_SECTIONS = ('model_args', 'transform_args', 'data_args')
 
 
 class BaseArgParser(object):
@@ -19,14 +34,30 @@ class BaseArgParser(object):
     def __init__(self):
         self.parser = argparse.ArgumentParser(description='CXR')
 
-        # MISC
+        self._add_misc_args()
+        self._add_model_args()
+        self._add_logger_args()
+        self._add_transform_args()
+        self._add_data_args()
+        self._add_eval_flags()
+
+        self.is_training = None
+        self.has_tasks_missing = None
+
+    def _add_misc_args(self):
         self.parser.add_argument('--batch_size', type=int, default=16, help='Batch size.')
 
         self.parser.add_argument('--gpu_ids', type=str, default='0',
                                  help='Comma-separated list of GPU IDs. Use -1 for CPU.')
-        self.parser.add_argument('--num_workers', default=8, type=int, help='Number of threads for the DataLoader.')
-
-        # Model args
+        self.parser.add_argument('--num_workers', default=None, type=int,
+                                 help='Number of threads for the DataLoader. Defaults to 4 per GPU, capped at the CPU count.')
+        self.parser.add_argument('--prefetch_factor', type=int, default=None,
+                                 help='Number of batches each DataLoader worker loads in advance (needs torch >= 1.7). '
+                                      'Defaults to the DataLoader default of 2. Higher values (e.g. 4) help keep the GPU '
+                                      'busy with expensive transforms (e.g. CLAHE), but gains plateau quickly and each '
+                                      'prefetched batch costs host memory.')
+
+    def _add_model_args(self):
         self.parser.add_argument('--model', dest='model_args.model', type=str,
                                  choices=('DenseNet121', 'ResNet152', 'Inceptionv4', 'ResNet18', 'ResNet34',
                                           'ResNeXt101', 'SEResNeXt101', 'NASNetA', 'SENet154', 'MNASNet'),
@@ -35,46 +66,51 @@ class BaseArgParser(object):
         self.parser.add_argument('--covar_list', dest='model_args.covar_list', type=str, default='',
                                  help='List of covariates from the image to be used')
         
-        self.parser.add_argument('--pretrained', dest='model_args.pretrained', type=util.str_to_bool, default=True,
+        self.parser.add_argument('--pretrained', dest='model_args.pretrained', type=str_to_bool, default=True,
                                  help='Use a petrained network')
         self.parser.add_argument('--ckpt_path', dest='model_args.ckpt_path', type=str, default='',
                                  help='Path to checkpoint to load. If empty, start from scratch.')
         self.parser.add_argument('--ckpt_paths', dest='model_args.ckpt_paths', type=str, nargs='*',
                                  help='List of ckpt paths for ensembling.')
-        self.parser.add_argument('--hierarchy', dest='model_args.hierarchy', type=util.str_to_bool, default=False,
+        self.parser.add_argument('--hierarchy', dest='model_args.hierarchy', type=str_to_bool, default=False,
                                  help='If true, adds a wrapper around the model that takes into account the \
                                  hiearchy of the labels')
         self.parser.add_argument('--model_uncertainty', dest='model_args.model_uncertainty',
-                                 type=util.str_to_bool, default=False,
+                                 type=str_to_bool, default=False,
                                  help='If true, model uncertainty explicity with (pos, neg, uncertain) outputs.')
-        self.parser.add_argument('--frontal_lateral', dest='model_args.frontal_lateral', type=util.str_to_bool, default=False,
+        self.parser.add_argument('--frontal_lateral', dest='model_args.frontal_lateral', type=str_to_bool, default=False,
                                  help='If true, train a model to classify frontal vs. lateral.')
-        self.parser.add_argument('--transform_classifier', dest='model_args.transform_classifier', type=util.str_to_bool, default=False,
+        self.parser.add_argument('--transform_classifier', dest='model_args.transform_classifier', type=str_to_bool, default=False,
                                  help='Set to true in case the saved model (in ckpt_path) has a different number of tasks.')
         self.parser.add_argument('--n_orig_classes', dest='model_args.n_orig_classes', default=0, type=int,
                                  help='Number of original classes in the loaded model (if transform_classifier is true).')
 
-        # Logger args
+    def _add_logger_args(self):
         self.parser.add_argument('--name', dest='logger_args.name', type=str, default='debugging', help='Experiment name.')
         self.parser.add_argument('--num_visuals', dest='logger_args.num_visuals', type=int, default=4,
                                  help='Maximum number of visuals per evaluation.')
 
         self.parser.add_argument('--save_dir', dest='logger_args.save_dir', type=str, default='ckpts/',
                                  help='Directory in which to save model checkpoints.')
-        self.parser.add_argument('--restart_epoch_count', dest='logger_args.restart_epoch_count', type=util.str_to_bool,
+        self.parser.add_argument('--restart_epoch_count', dest='logger_args.restart_epoch_count', type=str_to_bool,
                                  default=False, help='Start epoch count from epoch 1 vs. continue count of a pretrained model.')
         self.parser.add_argument('--probabilities_csv', dest='logger_args.probabilities_csv', type=str,
                                 help='Path to probabilities csv for weighting the CAMs by probability.')
+        self.parser.add_argument('--save_args', dest='logger_args.save_args', type=str_to_bool, default=True,
+                                 help='If true, save the args to args.json in the experiment dir. Test mode reads \
+                                 the model, transform and data args from the args.json next to a checkpoint.')
 
+    def _add_transform_args(self):
         # Data Transformations (put data augmentation in train_arg_parser)
         self.parser.add_argument('--scale', dest='transform_args.scale', type=int)
         self.parser.add_argument('--crop', dest='transform_args.crop', type=int)
-        self.parser.add_argument('--clahe', dest='transform_args.clahe', type=util.str_to_bool, default=False, help='CLAHE')
+        self.parser.add_argument('--clahe', dest='transform_args.clahe', type=str_to_bool, default=False, help='CLAHE')
         self.parser.add_argument('--normalization', dest='transform_args.normalization', choices=('imagenet', 'cxr_pulm_tb_norm'))
-        self.parser.add_argument('--maintain_ratio', dest='transform_args.maintain_ratio', type=util.str_to_bool, default=True)
+        self.parser.add_argument('--maintain_ratio', dest='transform_args.maintain_ratio', type=str_to_bool, default=True)
 
+    def _add_data_args(self):
         # Stanford and NIH dataset
-        self.parser.add_argument('--toy', dest='data_args.toy', type=util.str_to_bool, default=False,
+        self.parser.add_argument('--toy', dest='data_args.toy', type=str_to_bool, default=False,
                                  help='Use smaller dataset')
         self.parser.add_argument('--pocus_data_dir', dest='data_args.pocus_data_dir', type=str,
                                  default='/deep/group/aihc-bootcamp-fall2018/cxr-tb/data/original/TBPOC_CXR_Neil',
@@ -85,14 +121,6 @@ class BaseArgParser(object):
         self.parser.add_argument('--pulm_data_dir', dest='data_args.pulm_data_dir', type=str)
         self.parser.add_argument('--pulm_img_dir', dest='data_args.pulm_img_dir', type=str, default=None)
 
-        # User will have to set at least one eval_dataset flag to true
-        self.parser.add_argument('--eval_pocus', dest='data_args.eval_pocus', type=util.str_to_bool, default=False,
-                                 help='If true, evaluates Pocus during test and train')
-        self.parser.add_argument('--eval_hocus', dest='data_args.eval_hocus', type=util.str_to_bool, default=False,
-                                 help='If true, evaluates Hocus during test and train')
-        self.parser.add_argument('--eval_pulm', dest='data_args.eval_pulm', type=util.str_to_bool,
-                                 default=False, help='If true, evaluates pulm dataset during test and train')
-
         self.parser.add_argument('--uncertain_map_path', dest='data_args.uncertain_map_path', type=str, default=None,
                                  help='Path to CSV file which will replace the training CSV.')
         self.parser.add_argument('--task_sequence', dest='data_args.task_sequence', type=str, default=None,
@@ -102,8 +130,14 @@ class BaseArgParser(object):
         self.parser.add_argument('--fold_num', dest='data_args.fold_num', type=int, default=None,
                                  help='Fold number if using K-fold cross validation.')
 
-        self.is_training = None
-        self.has_tasks_missing = None
+    def _add_eval_flags(self):
+        # User will have to set at least one eval_dataset flag to true
+        self.parser.add_argument('--eval_pocus', dest='data_args.eval_pocus', type=str_to_bool, default=False,
+                                 help='If true, evaluates Pocus during test and train')
+        self.parser.add_argument('--eval_hocus', dest='data_args.eval_hocus', type=str_to_bool, default=False,
+                                 help='If true, evaluates Hocus during test and train')
+        self.parser.add_argument('--eval_pulm', dest='data_args.eval_pulm', type=str_to_bool,
+                                 default=False, help='If true, evaluates pulm dataset during test and train')
 
     @staticmethod
     def are_tasks_missing(task_sequence, eval_pocus, eval_hocus, eval_pulm, pocus_train_frac=None,
@@ -115,33 +149,29 @@ class BaseArgParser(object):
         Stanford and NIH, then there will be some labels in NIH that are missing from the sequence
         that we are training on."""
 
-        task_sequence = TASK_SEQUENCES[task_sequence]
-        task_seq_pocus = TASK_SEQUENCES['pocus']
-        task_seq_hocus = TASK_SEQUENCES['hocus']
-        task_seq_pulm = TASK_SEQUENCES['pulm']
+        task_set = _TASK_SETS[task_sequence]
+        datasets = zip((EVAL_FLAG_TO_DATASET[flag] for flag in EVAL_FLAGS),
+                       (eval_pocus, eval_hocus, eval_pulm),
+                       (pocus_train_frac, hocus_train_frac, pulm_train_frac))
 
-        if eval_pocus or pocus_train_frac == 1:
-            if set(task_sequence).issubset(set(task_seq_pocus)) is False:
-                return True
-
-        if eval_hocus or hocus_train_frac == 1:
-            if set(task_sequence).issubset(set(task_seq_hocus)) is False:
-                return True
-
-        if eval_pulm or pulm_train_frac == 1:
-            if set(task_sequence).issubset(set(task_seq_pulm)) is False:
+        for dataset_name, eval_dataset, train_frac in datasets:
+            if (eval_dataset or train_frac == 1) and not task_set.issubset(_TASK_SETS[dataset_name]):
                 return True
 
         return False
 
+    @staticmethod
     def namespace_to_dict(args):
-        """Turns a nested Namespace object to a nested dictionary"""
-        args_dict = vars(copy.deepcopy(args))
+        """Turns a nested Namespace object to a nested dictionary.
+
+        Only the namespaces are converted; leaf values are shared with `args`, not copied.
+        """
+        args_dict = {}
 
-        for arg in args_dict:
-            obj = args_dict[arg]
+        for arg, obj in vars(args).items():
             if isinstance(obj, argparse.Namespace):
-                args_dict[arg] = BaseArgParser.namespace_to_dict(obj)
+                obj = BaseArgParser.namespace_to_dict(obj)
+            args_dict[arg] = obj
 
         return args_dict
 
@@ -155,20 +185,21 @@ class BaseArgParser(object):
             Obs: Only one level of nesting is supported.
         """
 
-        group_name_keys = []
+        groups = defaultdict(dict)
+        flat = {}
 
-        for key in args.__dict__:
+        for key, value in args.__dict__.items():
             if '.' in key:
-                group, name = key.split('.')
-                group_name_keys.append((group, name, key))
+                group, name = key.split('.', 1)
+                groups[group][name] = value
+            else:
+                flat[key] = value
 
+        for group, group_args in groups.items():
+            flat[group] = argparse.Namespace(**group_args)
 
-        for group, name, key in group_name_keys:
-            if group not in args:
-                args.__dict__[group] = argparse.Namespace()
-
-            args.__dict__[group].__dict__[name] = args.__dict__[key]
-            del args.__dict__[key]
+        args.__dict__.clear()
+        args.__dict__.update(flat)
 
     def parse_args(self):
         args = self.parser.parse_args()
@@ -212,47 +243,40 @@ class BaseArgParser(object):
             ckpt_args = os.path.join(os.path.dirname(ckpt_path), 'args.json')
             with open(ckpt_args, 'r') as f:
               file_args = json.load(f)
-            
-            # Add model args from json to args namespace
-            model_args = file_args['model_args']
-            del model_args['ckpt_path']
-            print(f'\nUses the following model args from args.json: {model_args}')
-            dict_def = vars(args)
-            for key in model_args:
-              setattr(dict_def['model_args'], key, model_args[key])
-            
-            args.model_args.ckpt_paths = ckpt_paths
-            
-            # Add transform args from json to args namespace
-            transform_args = file_args['transform_args']
-            print(f'\nUses the following transform args from args.json: {transform_args}')
-            dict_def = vars(args)
-            for key in transform_args:
-              setattr(dict_def['transform_args'], key, transform_args[key])
+            del file_args['model_args']['ckpt_path']
 
-            # Add data args from json to args namespace
-            data_args = file_args['data_args']
-            print(f'\nUses the following data args from args.json: {data_args}')
+            # Add model, transform and data args from json to args namespace
             dict_def = vars(args)
-            print(f'\n{data_args}\n')
-            for key in data_args:
-              setattr(dict_def['data_args'], key, data_args[key])
+            for section in _CKPT_ARG_SECTIONS:
+              section_args = file_args[section]
+              print(f'\nUses the following {section.replace("_", " ")} from args.json: {section_args}')
+              for key, value in section_args.items():
+                setattr(dict_def[section], key, value)
+
+            args.model_args.ckpt_paths = ckpt_paths
 
             args = argparse.Namespace(**dict_def)
             print(f'\nUsing the following args: {args}')
 
 
+        # Pick the number of DataLoader workers from the machine if not given
+        if args.num_workers is None:
+            num_gpus = len(args_to_list(args.gpu_ids, allow_empty=True, arg_type=int, allow_negative=False))
+            args.num_workers = min(os.cpu_count() or 4, 4 * max(1, num_gpus))
+            print(f'Using {args.num_workers} DataLoader workers.')
+
         # get the epoch time, and add a random string
-        random_string = '_' + uuid.uuid4().hex.upper()[0:6]
+        random_string = '_' + os.urandom(3).hex().upper()
         date_string = str(int(time.time() * 1000)) + random_string
         print(args.logger_args.name)
         args.logger_args.dir_name = '{}_{}'.format(args.logger_args.name, date_string)
         save_dir = os.path.join(args.logger_args.save_dir, args.logger_args.dir_name)
 
         os.makedirs(save_dir, exist_ok=True)
-        with open(os.path.join(save_dir, 'args.json'), 'w') as fh:
-            json.dump(BaseArgParser.namespace_to_dict(args), fh, indent=4, sort_keys=True)
-            fh.write('\n')
+        if args.logger_args.save_args:
+            with open(os.path.join(save_dir, 'args.json'), 'w') as fh:
+                json.dump(BaseArgParser.namespace_to_dict(args), fh, indent=2)
+                fh.write('\n')
         args.logger_args.save_dir = save_dir
 
         # Add configuration flags outside of the CLI
@@ -274,17 +298,15 @@ class BaseArgParser(object):
                    ('accuracy' in args.logger_args.metric_name and args.logger_args.maximize_metric)
 
         # Save dataset name to data_args
-        if args.data_args.eval_pocus:
-            args.data_args.dataset_name = 'pocus'
-        elif args.data_args.eval_hocus:
-            args.data_args.dataset_name = 'hocus'
-        elif args.data_args.eval_pulm:
-            args.data_args.dataset_name = 'pulm'
-        else:
+        active_flags = [flag for flag in EVAL_FLAGS if getattr(args.data_args, flag)]
+        if not active_flags:
             raise Exception('need to select a dataset to evaluate on')
+        args.data_args.dataset_name = EVAL_FLAG_TO_DATASET[active_flags[0]]
 
         # Set up available GPUs
-        args.gpu_ids = util.args_to_list(args.gpu_ids, allow_empty=True, arg_type=int, allow_negative=False)
+        import torch
+        import torch.backends.cudnn as cudnn
+        args.gpu_ids = args_to_list(args.gpu_ids, allow_empty=True, arg_type=int, allow_negative=False)
         if len(args.gpu_ids) > 0 and torch.cuda.is_available():
             # Set default GPU for `tensor.to('cuda')`
             torch.cuda.set_device(args.gpu_ids[0])
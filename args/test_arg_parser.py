@@ -1,5 +1,4 @@
-import util
-
+from .arg_util import str_to_bool
 from .base_arg_parser import BaseArgParser
 
 
@@ -11,17 +10,23 @@ class TestArgParser(BaseArgParser):
 
         self.parser.add_argument('--results_dir', dest='logger_args.results_dir',type=str, default='results/',
                                  help='Save dir for test results.')
-        self.parser.add_argument('--save_cams', dest='logger_args.save_cams', type=util.str_to_bool, default=False, help='If true, will save cams to experiment_folder/cams')
+        self.parser.add_argument('--save_cams', dest='logger_args.save_cams', type=str_to_bool, default=False, help='If true, will save cams to experiment_folder/cams')
         self.parser.add_argument('--output_csv_name', dest='logger_args.output_csv_name', type=str,
                                  default='output_probs.csv', help='Name for output CSV file (distill.py only).')
         self.parser.add_argument('--split', dest='data_args.split', type=str, default='valid',
                                  choices=('train', 'valid', 'test', 'report-test'))
 
-        self.parser.add_argument('--only_competition_cams', dest='logger_args.only_competition_cams', type=util.str_to_bool, default=True, help='If true, will only generate cams on competition labels. Only relevant if --save_cams is True')
-        self.parser.add_argument('--write_results', dest='logger_args.write_results', type=util.str_to_bool, default=True, help='If true, will append results to results.csv')
-        self.parser.add_argument('--use_csv_probs', dest='model_args.use_csv_probs', type=util.str_to_bool, default=False,
+        self.parser.add_argument('--only_competition_cams', dest='logger_args.only_competition_cams', type=str_to_bool, default=True, help='If true, will only generate cams on competition labels. Only relevant if --save_cams is True')
+        self.parser.add_argument('--write_results', dest='logger_args.write_results', type=str_to_bool, default=True, help='If true, will append results to results.csv')
+        self.parser.add_argument('--use_csv_probs', dest='model_args.use_csv_probs', type=str_to_bool, default=False,
                                  help='Use a CSV of probabilities instead of an actual model.')
         self.parser.add_argument('--config_path', type=str, default=None)
+        self.parser.add_argument('--eval_precision', type=str, default='fp32', choices=('fp32', 'fp16', 'bf16'),
+                                 help='Precision for the model forward pass during evaluation (fp16/bf16 use autocast).')
+        self.parser.add_argument('--compile', type=str_to_bool, default=True,
+                                 help='If true, compile the model with torch.compile when evaluating on a single GPU. \
+                                 Ignored with multiple --gpu_ids, since DataParallel does not work with CUDA graphs. \
+                                 The first batch is slower while the kernels are generated.')
 
         # Multi model args
         self.parser.add_argument('--use_multi_model', type=bool, help='Enables use of one model for each view')
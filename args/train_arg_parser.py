@@ -1,5 +1,5 @@
+from .arg_util import str_to_bool
 from .base_arg_parser import BaseArgParser
-import util
 
 
 class TrainArgParser(BaseArgParser):
@@ -21,7 +21,7 @@ class TrainArgParser(BaseArgParser):
                                  help='Max number of examples to evaluate from the training set.')
         self.parser.add_argument('--max_ckpts', dest='logger_args.max_ckpts', type=int, default=3,
                                  help='Number of checkpoints to keep before overwriting old ones.')
-        self.parser.add_argument('--keep_topk', dest='logger_args.keep_topk', type=util.str_to_bool,
+        self.parser.add_argument('--keep_topk', dest='logger_args.keep_topk', type=str_to_bool,
                                  default=True, help='Keep the top K checkpoints instead of most recent K checkpoints.')
 
         # MISC
@@ -31,7 +31,7 @@ class TrainArgParser(BaseArgParser):
                                  help='Upweight TB by a factor equal to the number of clinical findings')
         # Evaluator args
         self.parser.add_argument('--metric_name', type=str, dest='logger_args.metric_name')
-        self.parser.add_argument('--maximize_metric', dest='logger_args.maximize_metric', type=util.str_to_bool, default=True,
+        self.parser.add_argument('--maximize_metric', dest='logger_args.maximize_metric', type=str_to_bool, default=True,
                                  help='If True, maximize the metric specified by metric_name. Otherwise, minimize it.')
 
         # Optimizer
@@ -84,10 +84,10 @@ class TrainArgParser(BaseArgParser):
                                  help='Fraction of Neil Pocus few shot examples to train on')
 
         self.parser.add_argument('--train_on_studies', dest='data_args.train_on_studies',
-                                 type=util.str_to_bool, default=False,
+                                 type=str_to_bool, default=False,
                                  help='If true, you train on the study level, instead of training on the level \
                                  of the individual image.')
 
         # Data augmentation
-        self.parser.add_argument('--horizontal_flip', dest='transform_args.horizontal_flip', type=util.str_to_bool, default=False)
+        self.parser.add_argument('--horizontal_flip', dest='transform_args.horizontal_flip', type=str_to_bool, default=False)
         self.parser.add_argument('--transform_affine_all', dest='transform_args.transform_affine_all', type=float)
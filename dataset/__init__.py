@@ -4,7 +4,7 @@ from .concat_dataset import ConcatDataset
 from .constants import *
 from .label_mapper import LabelMapper
 from .label_mapper import TASK_SEQUENCES
-from .get_loader import get_loader, get_eval_loaders
+from .get_loader import get_loader, get_eval_loaders, get_class_weights
 # from .tcga_dataset import TCGADataset
 
 
@@ -81,17 +81,39 @@ class BaseDataset(Dataset):
         """
 
         # Set weights for positive vs negative examples
-        self.p_count = (labels == 1).sum(axis=0)
-        self.n_count = (labels == 0).sum(axis=0)
+        self.p_count, self.n_count = self.get_label_counts(labels, self.label_mapper)
+        self.total = self.p_count + self.n_count
+        self.class_weights = self.counts_to_class_weights(self.p_count, self.n_count)
 
-        if self.label_mapper is not None:
-            self.p_count = self.label_mapper.map(self.p_count)
-            self.n_count = self.label_mapper.map(self.n_count)
+    @staticmethod
+    def get_label_counts(labels, label_mapper=None):
+        """Count the positive and negative examples of each task.
 
-        self.total = self.p_count + self.n_count
+        Args:
+            labels: Dataframe or numpy array of labels, shape (num_examples, num_labels).
+            label_mapper: Optional LabelMapper to map the counts to the target task sequence.
+
+        Return:
+            (p_count, n_count): Number of positive and negative examples per task.
+        """
+        p_count = (labels == 1).sum(axis=0)
+        n_count = (labels == 0).sum(axis=0)
 
-        self.class_weights = [self.n_count / self.total,
-                        self.p_count / self.total]
+        if label_mapper is not None:
+            p_count = label_mapper.map(p_count)
+            n_count = label_mapper.map(n_count)
+
+        return p_count, n_count
+
+    @staticmethod
+    def counts_to_class_weights(p_count, n_count):
+        """Turn positive and negative counts into class weights (see _set_class_weights).
+
+        Return:
+            list: [negative weights, positive weights], one value per task in each.
+        """
+        total = p_count + n_count
+        return [n_count / total, p_count / total]
 
     def _set_transforms(self, t_args):
         """Set the transforms
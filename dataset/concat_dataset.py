@@ -1,6 +1,8 @@
 import bisect
 from torch.utils.data import Dataset
 
+from .base_dataset import BaseDataset
+
 
 class ConcatDataset(Dataset):
     """https://pytorch.org/docs/stable/_modules/torch/utils/data/dataset.html#ConcatDataset
@@ -33,11 +35,7 @@ class ConcatDataset(Dataset):
             p_count = p_count + dataset.p_count
             n_count = n_count + dataset.n_count
 
-        total_count = p_count + n_count
-        class_weights = [n_count / total_count,
-                        p_count / total_count]
-
-        return class_weights
+        return BaseDataset.counts_to_class_weights(p_count, n_count)
 
 
     def __init__(self, datasets):
@@ -60,16 +60,21 @@ class CXRDataset(BaseDataset):
         self.covariates = self.get_covariates()
         self._set_class_weights(self.labels)
 
-    def load_df(self):
-        """Load the data from data_dir to a Pandas dataframe."""
-        if self.split == 'test':
+    @staticmethod
+    def get_csv_path(data_dir, split, fold_num=None):
+        """Return the path to the CSV file of a split (and fold)."""
+        if split == 'test':
             # there is no fold
-            filename = (self.split + "_data.csv")
+            filename = (split + "_data.csv")
         else:
-            filename = (self.split + "_data_" + str(self.fold_num)
-                    + ".csv" if self.fold_num is not None else
-                    self.split + "_data.csv")
-        csv_path = self.data_dir / filename
+            filename = (split + "_data_" + str(fold_num)
+                    + ".csv" if fold_num is not None else
+                    split + "_data.csv")
+        return Path(data_dir) / filename
+
+    def load_df(self):
+        """Load the data from data_dir to a Pandas dataframe."""
+        csv_path = self.get_csv_path(self.data_dir, self.split, self.fold_num)
         df = pd.read_csv(csv_path)
         df.reset_index(drop=True)
         # self.df is returned just to maintain clarity in the __init__
@@ -88,17 +93,30 @@ class CXRDataset(BaseDataset):
     def get_disease_labels(self):
         """Return labels as K-element arrays for the three diseases.
 
+        Return:
+            ndarray: (N * K) numpy array of labels.
+        """
+        return self.disease_labels_from_df(self.df, self.dataset_name)
+
+    @staticmethod
+    def disease_labels_from_df(df, dataset_name):
+        """Return the labels of a dataframe as K-element arrays.
+
+        Args:
+            df (DataFrame): Dataframe containing (at least) the label columns of the dataset.
+            dataset_name (string): Dataset whose task sequence gives the label columns.
+
         Return:
             ndarray: (N * K) numpy array of labels.
         """
         # construct the label matrix
-        num_data_points = len(self.df.index)
-        num_labels = len(TASK_SEQUENCES[self.dataset_name])
+        num_data_points = len(df.index)
+        num_labels = len(TASK_SEQUENCES[dataset_name])
         labels = np.zeros([num_data_points, num_labels])
 
         # populate the label matrix
-        diseases = [dis for dis in TASK_SEQUENCES[self.dataset_name]]
-        label_df = self.df[diseases].apply(pd.to_numeric, errors='coerce')
+        diseases = [dis for dis in TASK_SEQUENCES[dataset_name]]
+        label_df = df[diseases].apply(pd.to_numeric, errors='coerce')
         # remove all NaNs that came up because of the above operation
         label_df.fillna(0.0)
 
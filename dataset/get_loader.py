@@ -1,3 +1,4 @@
+import pandas as pd
 import torch.utils.data as data
 
 from .concat_dataset import ConcatDataset
@@ -5,10 +6,68 @@ from .concat_dataset import ConcatDataset
 # from .nih_dataset import NIHDataset
 # from .tcga_dataset import TCGADataset
 from .cxr_dataset import CXRDataset
-from .label_mapper import TASK_SEQUENCES
+from .label_mapper import TASK_SEQUENCES, LabelMapper
 from .pad_collate import PadCollate
 
 
+CXR_DATASETS = ('pocus', 'hocus', 'pulm')
+
+
+def _get_cxr_dirs(data_args, cxr_ds):
+    """Returns the (data_dir, img_dir) of a CXR dataset. img_dir is None for the default location."""
+    if cxr_ds == 'pocus':
+        return data_args.pocus_data_dir, None
+    elif cxr_ds == 'hocus':
+        return data_args.hocus_data_dir, None
+    else:
+        return data_args.pulm_data_dir, data_args.pulm_img_dir
+
+
+def _get_cxr_datasets(cxr_frac):
+    """Returns the names of the CXR datasets a loader uses for `cxr_frac`.
+
+       These are the datasets with a non-zero fraction. Two datasets are
+       concatenated, otherwise only the first one is used.
+    """
+    cxr_datasets = [cxr_ds for cxr_ds in CXR_DATASETS if cxr_frac.get(cxr_ds, 0) != 0]
+    return cxr_datasets if len(cxr_datasets) == 2 else cxr_datasets[:1]
+
+
+def get_class_weights(data_args, split, task_sequence, cxr_frac, fold_num=None):
+    """Returns the class weights of a split without building its datasets.
+
+       Only the label columns of each CSV are read, so no image paths,
+       covariates or transforms are set up. The weights are the same as
+       `loader.dataset.class_weights` of the (non-training) loader that
+       `get_loader` returns for the same arguments.
+
+    Args:
+        data_args: Data arguments, used to find the data directory of each CXR dataset.
+        split: String determining the CSV to read (e.g. train, valid).
+        task_sequence: Dict of the tasks the weights are computed for.
+        cxr_frac: Dictionary that specifies which CXR datasets are used (non-zero fraction).
+        fold_num: Fold number if using K-fold cross validation.
+
+    Return:
+        list: [negative weights, positive weights], one value per task in each.
+    """
+    p_count = 0
+    n_count = 0
+    for cxr_ds in _get_cxr_datasets(cxr_frac):
+        data_dir, _ = _get_cxr_dirs(data_args, cxr_ds)
+        csv_path = CXRDataset.get_csv_path(data_dir, split, fold_num)
+        original_tasks = TASK_SEQUENCES[cxr_ds]
+        label_df = pd.read_csv(csv_path, usecols=list(original_tasks))
+        labels = CXRDataset.disease_labels_from_df(label_df, cxr_ds)
+
+        label_mapper = LabelMapper(original_tasks, task_sequence) if original_tasks != task_sequence else None
+        ds_p_count, ds_n_count = CXRDataset.get_label_counts(labels, label_mapper)
+        p_count = p_count + ds_p_count
+        n_count = n_count + ds_n_count
+
+    return CXRDataset.counts_to_class_weights(p_count, n_count)
+
+
 def get_loader(data_args,
                transform_args,
                split,
@@ -24,7 +83,10 @@ def get_loader(data_args,
                frontal_lateral=False,
                return_info_dict=False,
                covar_list='',
-               fold_num=None):
+               fold_num=None,
+               num_workers=8,
+               pin_memory=False,
+               prefetch_factor=None):
 
     """Returns a dataset loader.
 
@@ -44,6 +106,10 @@ def get_loader(data_args,
             Only applicable for the SU dataset.
         return_info_dict: If true, return a dict of info with each image.
         covar_list: List of strings, specifying the covariates to be sent along with the images. 
+        num_workers: Number of worker processes for the DataLoader.
+        pin_memory: If true, batches are put in pinned memory for faster (async) copies to the GPU.
+        prefetch_factor: Number of batches loaded in advance by each worker. If None, or if num_workers is 0,
+            the DataLoader default is used (the kwarg needs torch >= 1.7).
 
     Return:
         DataLoader: A dataloader
@@ -53,32 +119,23 @@ def get_loader(data_args,
         study_level = data_args.train_on_studies
 
     datasets = []
-    for cxr_ds in ['pocus', 'hocus', 'pulm']:
-        if cxr_ds in cxr_frac.keys() and cxr_frac[cxr_ds] != 0:
-            if cxr_ds == 'pocus':
-                data_dir = data_args.pocus_data_dir
-                img_dir = None
-            elif cxr_ds == 'hocus':
-                data_dir = data_args.hocus_data_dir
-                img_dir = None
-            else:
-                data_dir = data_args.pulm_data_dir
-                img_dir = data_args.pulm_img_dir
-
-            datasets.append(
-                CXRDataset(
-                    data_dir,
-                    transform_args, split=split,
-                    covar_list=covar_list,
-                    is_training=is_training,
-                    dataset_name=cxr_ds,
-                    tasks_to=task_sequence,
-                    frac=cxr_frac[cxr_ds],
-                    toy=data_args.toy,
-                    img_dir=img_dir,
-                    fold_num=fold_num,
-                )
+    for cxr_ds in _get_cxr_datasets(cxr_frac):
+        data_dir, img_dir = _get_cxr_dirs(data_args, cxr_ds)
+
+        datasets.append(
+            CXRDataset(
+                data_dir,
+                transform_args, split=split,
+                covar_list=covar_list,
+                is_training=is_training,
+                dataset_name=cxr_ds,
+                tasks_to=task_sequence,
+                frac=cxr_frac[cxr_ds],
+                toy=data_args.toy,
+                img_dir=img_dir,
+                fold_num=fold_num,
             )
+        )
 
     if len(datasets) == 2:
         assert study_level is False, "Currently, you can't create concatenated datasets when training on studies"
@@ -86,25 +143,35 @@ def get_loader(data_args,
     else:
         dataset = datasets[0]
 
+    # DataLoader only accepts prefetch_factor when it uses worker processes (and from torch 1.7)
+    prefetch_kwargs = {}
+    if prefetch_factor is not None and num_workers > 0:
+        prefetch_kwargs['prefetch_factor'] = prefetch_factor
+
     # Pick collate function
     if study_level and not data_args.eval_tcga:
         collate_fn = PadCollate(dim=0)
         loader = data.DataLoader(dataset,
                              batch_size=batch_size,
                              shuffle=shuffle,
-                             num_workers=8,
-                             collate_fn=collate_fn)
+                             num_workers=num_workers,
+                             pin_memory=pin_memory,
+                             collate_fn=collate_fn,
+                             **prefetch_kwargs)
     else:
         loader = data.DataLoader(dataset,
                              batch_size=batch_size,
                              shuffle=shuffle,
-                             num_workers=8)
+                             num_workers=num_workers,
+                             pin_memory=pin_memory,
+                             **prefetch_kwargs)
 
     return loader
 
 
 def get_eval_loaders(data_args, transform_args, task_sequence, batch_size,
-                     frontal_lateral, return_info_dict=False, covar_list='', fold_num=None):
+                     frontal_lateral, return_info_dict=False, covar_list='', fold_num=None, num_workers=8,
+                     pin_memory=False, prefetch_factor=None):
     """Returns a dataset loader
        If both stanford_frac and nih_frac is one, the loader
        will sample both NIH and Stanford data.
@@ -115,6 +182,9 @@ def get_eval_loaders(data_args, transform_args, task_sequence, batch_size,
         args: Additional arguments needed to load the dataset.
         return_info_dict: If true, return a dict of info with each image.
         covar_list: List of covariates as strings that we want from the dataset
+        num_workers: Number of worker processes for each DataLoader.
+        pin_memory: If true, batches are put in pinned memory for faster (async) copies to the GPU.
+        prefetch_factor: Number of batches loaded in advance by each worker (None for the DataLoader default).
 
     Return:
         DataLoader: A dataloader
@@ -139,7 +209,10 @@ def get_eval_loaders(data_args, transform_args, task_sequence, batch_size,
                                         shuffle=False,
                                         return_info_dict=return_info_dict,
                                         covar_list=covar_list,
-                                        fold_num=fold_num)]
+                                        fold_num=fold_num,
+                                        num_workers=num_workers,
+                                        pin_memory=pin_memory,
+                                        prefetch_factor=prefetch_factor)]
 
     return eval_loaders
 
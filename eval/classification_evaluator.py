@@ -1,5 +1,6 @@
 import os
 import torch
+from contextlib import ExitStack
 import sklearn.metrics as sk_metrics
 import numpy as np
 import pandas as pd
@@ -8,6 +9,7 @@ from .average_meter import AverageMeter
 from .loss import get_loss_fn
 from .base_evaluator import BaseEvaluator
 from tqdm import tqdm
+from util import INFERENCE_MODE
 from .metric.collate_accuracy import collate_accuracy_score
 
 #TODO: Figure out how to handle imports from projects
@@ -21,7 +23,8 @@ class ClassificationEvaluator(BaseEvaluator):
     """Class for evaluating a model during training and testing."""
     def __init__(self, data_loaders, logger, num_visuals=None,
                  iters_per_eval=1, has_missing_tasks=False, model_uncertainty=False,
-                 class_weights=None, max_eval=None, device=None, optimizer=None):
+                 class_weights=None, max_eval=None, device=None, optimizer=None, channels_last=False,
+                 autocast_dtype=None):
         """
         Args:
             data_loaders: List of Torch `DataLoader`s to sample from.
@@ -31,6 +34,8 @@ class ClassificationEvaluator(BaseEvaluator):
             iters_per_eval: Number of iterations between each evaluation.
             rad_perf: Dataframe of radiologist performance.
             save_path: Path to save CSV file.
+            channels_last: If true, inputs are converted to channels-last memory format (to match the model).
+            autocast_dtype: If set (e.g. torch.float16), the forward pass runs under autocast with this dtype.
         """
         super().__init__(data_loaders, logger, num_visuals, iters_per_eval, optimizer=optimizer)
         self.max_eval = None if max_eval is None or max_eval < 0 else max_eval
@@ -40,6 +45,8 @@ class ClassificationEvaluator(BaseEvaluator):
                                      has_missing_tasks, mask_uncertain=False, class_weights=class_weights)
         self.model_uncertainty = model_uncertainty
         self.device = device
+        self.channels_last = channels_last
+        self.autocast_dtype = autocast_dtype
 
 
 
@@ -75,17 +82,31 @@ class ClassificationEvaluator(BaseEvaluator):
                 if num_evaluated >= num_examples:
                     break
 
-                with torch.no_grad():
+                with INFERENCE_MODE():
                     inputs, targets, info_dict, covars = data
 
-                    logits = model.forward([inputs.to(device), covars])
-
-                    unweighted_loss = self.uw_loss_fn(logits, targets.to(self.device))
+                    # non_blocking only overlaps the copy with compute when the loader pins memory
+                    if self.channels_last:
+                        device_inputs = inputs.to(device, non_blocking=True, memory_format=torch.channels_last)
+                    else:
+                        device_inputs = inputs.to(device, non_blocking=True)
+                    device_targets = targets.to(self.device, non_blocking=True)
+                    if self.autocast_dtype is None:
+                        # An empty ExitStack is a no-op context (nullcontext needs Python 3.7)
+                        autocast = ExitStack()
+                    else:
+                        autocast = torch.autocast(torch.device(device).type, dtype=self.autocast_dtype)
+                    with autocast:
+                        logits = model.forward([device_inputs, covars])
+                    # Losses and metrics are computed in full precision
+                    logits = logits.float()
+
+                    unweighted_loss = self.uw_loss_fn(logits, device_targets)
 
                     batch_probs = torch.sigmoid(logits)
 
                     if self.w_loss_fn is not None:
-                        weighted_loss = self.w_loss_fn(logits, targets.to(self.device))
+                        weighted_loss = self.w_loss_fn(logits, device_targets)
                         records['w_loss_meter'].update(weighted_loss.item(), logits.size(0))
 
                     # TODO (amit): redesign this logic.
@@ -10,7 +10,9 @@ def get_evaluator(type_eval, data_loaders, logger, eval_args):
                                        eval_args['class_weights'],
                                        eval_args['max_eval'],
                                        eval_args['device'],
-                                       eval_args['optimizer'])
+                                       eval_args['optimizer'],
+                                       eval_args.get('channels_last', False),
+                                       eval_args.get('autocast_dtype'))
     else:
         #TODO: Implement RegressionEvaluator
         return None
\ No newline at end of file
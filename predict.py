@@ -112,7 +112,8 @@ def run_models(args, csv_cols, models, task_sequence):
     # Get eval loader
     data_loader = get_loader(data_args, transform_args, data_args.split,
                              TASK_SEQUENCES[data_args.task_sequence], su_frac=1, nih_frac=0, batch_size=args.batch_size,
-                             is_training=False, shuffle=False, study_level=True, return_info_dict=True)
+                             is_training=False, shuffle=False, study_level=True, return_info_dict=True,
+                             num_workers=args.num_workers, prefetch_factor=args.prefetch_factor)
 
     num_models_finished = 0
     for ckpt_path, is_3class in models:
@@ -151,7 +152,7 @@ def run_models(args, csv_cols, models, task_sequence):
         with tqdm(total=num_examples, unit=' ' + data_args.split + ' ' + data_args.dataset_name) as progress_bar:
             for inputs, targets, info_dict, mask in data_loader:
 
-                with torch.no_grad():
+                with util.INFERENCE_MODE():
 
                     # For Stanford, evaluate on studies
                     if data_args.dataset_name == 'stanford':
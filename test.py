@@ -1,22 +1,15 @@
+import csv
+import math
 import os
-import torch
 import time
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-plt.switch_backend('agg')
 from pathlib import Path
 
-from args import TestArgParser
-from dataset import get_loader, get_eval_loaders, TASK_SEQUENCES
-from eval import get_evaluator
-from models import CSVReaderModel, MultiModelWrapper, EnsembleModel
-from saver import ModelSaver
-from predict import get_config
+# Heavy dependencies (torch, pandas, dataset, models, ...) are imported inside
+# the functions that use them so that `python test.py --help` stays fast.
 # from scripts.get_cams import save_grad_cams
 
 
-NAN = np.nan
+NAN = float('nan')
 
 
 def test(args):
@@ -28,12 +21,24 @@ def test(args):
         3. Get data eval loaders and evaluator.
         4. Evaluate and save model performance (metrics and curves).
     """
+    import pandas as pd
+    import torch
+    from args import EVAL_FLAGS, EVAL_FLAG_TO_DATASET
+    from dataset import get_loader, get_class_weights, TASK_SEQUENCES
+    from eval import get_evaluator
+    from models import CSVReaderModel, EnsembleModel
+    from saver import ModelSaver
+    from predict import get_config
 
     model_args = args.model_args
     logger_args = args.logger_args
     data_args = args.data_args
     transform_args = args.transform_args
 
+    # Check before loading the model and data, so an unsupported precision fails fast
+    if args.eval_precision != 'fp32' and not hasattr(torch, 'autocast'):
+        raise ValueError(f'--eval_precision {args.eval_precision} requires torch.autocast (torch >= 1.10).')
+
     # Get model
     if args.use_multi_model:
         model = load_multi_model(args.multi, model_args, data_args, args.gpu_ids)
@@ -53,6 +58,22 @@ def test(args):
     model = model.to(args.device)
     model.eval()
 
+    # Convolutions run faster in channels-last (NHWC) layout on the GPU.
+    # The ensemble and CSV wrappers are not nn.Modules and only support .to(device).
+    # Memory formats need torch >= 1.5.
+    channels_last = (args.device == 'cuda' and isinstance(model, torch.nn.Module)
+                     and hasattr(torch, 'channels_last'))
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    # All eval batches have the same shape, so the compiled kernels are reused.
+    # Grad-CAM needs hooks on the original modules, so don't compile when saving CAMs.
+    # DataParallel's scatter/replicate does not work with CUDA graphs, so only compile on a
+    # single GPU, and compile the wrapped module so that the DataParallel wrapper is kept.
+    if (args.compile and channels_last and not logger_args.save_cams and hasattr(torch, 'compile')
+            and len(args.gpu_ids) == 1 and isinstance(model, torch.nn.DataParallel)):
+        model.module = torch.compile(model.module, mode='reduce-overhead', fullgraph=False)
+
     # Get the task sequence that the model outputs.
     # Newer models have an attribute called 'task_sequence'.
     # For older models we need to specify what
@@ -64,38 +85,40 @@ def test(args):
     #     print(f'WARNING: assuming that the models task sequence is \n {task_sequence}')
     task_sequence = TASK_SEQUENCES[data_args.task_sequence]
 
-    cxr_frac = {'pocus': data_args.eval_pocus, 'hocus': data_args.eval_hocus,
-                'pulm': data_args.eval_pulm}
-    # Get train loader in order to get the class weights
+    cxr_frac = {EVAL_FLAG_TO_DATASET[flag]: getattr(data_args, flag) for flag in EVAL_FLAGS}
+    # Get the class weights from the training labels
     train_csv_name = 'train'
     if data_args.uncertain_map_path is not None:
         train_csv_name = data_args.uncertain_map_path
-    loader = get_loader(data_args,
-                        args.transform_args,
-                        train_csv_name,
-                        task_sequence,
-                        su_frac = 1 if data_args.eval_su else 0,
-                        nih_frac = 1 if data_args.eval_nih else 0,
-                        cxr_frac=cxr_frac,
-                        tcga_frac = 1 if data_args.eval_tcga else 0,
-                        batch_size=args.batch_size,
-                        covar_list=model_args.covar_list,
-                        fold_num=data_args.fold_num)
-    class_weights = loader.dataset.class_weights
-
-    # Get eval loaders and radiologist performance
-    eval_loader = get_eval_loaders(data_args,
-                                   transform_args,
-                                   task_sequence,
-                                   args.batch_size,
-                                   frontal_lateral=model_args.frontal_lateral,
-                                   return_info_dict=model_args.use_csv_probs or logger_args.save_cams,
-                                   covar_list=model_args.covar_list,
-                                   fold_num=data_args.fold_num)[-1] # Evaluate only on valid
+    class_weights = get_class_weights(data_args,
+                                      train_csv_name,
+                                      task_sequence,
+                                      cxr_frac,
+                                      fold_num=data_args.fold_num)
 
     rad_perf = pd.read_csv(data_args.su_rad_perf_path) if data_args.su_rad_perf_path is not None else None
 
-    if data_args.split != 'valid':
+    # Get eval loader
+    if data_args.split == 'valid':
+        # Build only the valid loader of the dataset (get_eval_loaders would also build train)
+        eval_loader = get_loader(data_args,
+                                 transform_args,
+                                 'valid',
+                                 task_sequence,
+                                 su_frac=0,
+                                 nih_frac=0,
+                                 cxr_frac={data_args.dataset_name: 1},
+                                 tcga_frac=0,
+                                 batch_size=args.batch_size,
+                                 is_training=False,
+                                 shuffle=False,
+                                 return_info_dict=model_args.use_csv_probs or logger_args.save_cams,
+                                 covar_list=model_args.covar_list,
+                                 fold_num=data_args.fold_num,
+                                 num_workers=args.num_workers,
+                                 pin_memory=args.device == 'cuda',
+                                 prefetch_factor=args.prefetch_factor)
+    else:
         eval_loader = get_loader(data_args,
                                  args.transform_args,
                                  data_args.split,
@@ -106,7 +129,10 @@ def test(args):
                                  tcga_frac = 1 if data_args.eval_tcga else 0,
                                  batch_size = args.batch_size,
                                  covar_list=model_args.covar_list,
-                                 fold_num=data_args.fold_num)
+                                 fold_num=data_args.fold_num,
+                                 num_workers=args.num_workers,
+                                 pin_memory=args.device == 'cuda',
+                                 prefetch_factor=args.prefetch_factor)
 
     results_dir = os.path.join(logger_args.results_dir, data_args.split)
     os.makedirs(results_dir, exist_ok=True)
@@ -125,6 +151,10 @@ def test(args):
         eval_args['max_eval'] = None
         eval_args['device'] = args.device
         eval_args['optimizer'] = None
+        eval_args['channels_last'] = channels_last
+        eval_args['autocast_dtype'] = None
+        if args.eval_precision != 'fp32':
+            eval_args['autocast_dtype'] = torch.float16 if args.eval_precision == 'fp16' else torch.bfloat16
         evaluator = get_evaluator('classification', [eval_loader], None, eval_args)
 
         metrics, curves = evaluator.evaluate(model, args.device,
@@ -136,10 +166,10 @@ def test(args):
 
         if logger_args.write_results:
             results_path = os.path.join(results_dir, f'scores.csv')
-            evaluate_task_sequence = 'competition' if data_args.dataset_name == 'stanford' else data_args.task_sequence
+            eval_tasks = TASK_SEQUENCES['competition'] if data_args.dataset_name == 'stanford' else task_sequence
             write_results(data_args.dataset_name, data_args.split, eval_metrics,
                           metrics, results_path, logger_args.name, ckpt_info,
-                          evaluate_task_sequence)
+                          eval_tasks)
 
     # Save visuals
     if logger_args.save_cams:
@@ -153,6 +183,8 @@ def test(args):
 
 def load_multi_model(multi_args, model_args, data_args, gpu_ids):
     """Load multi lodel (a frontal model and a lateral model)."""
+    from models import MultiModelWrapper
+    from saver import ModelSaver
 
     model_ap, ckpt_info_ap = ModelSaver.load_model(multi_args.ap_ckpt_path, gpu_ids, model_args, data_args)
     model_pa, ckpt_info_pa = ModelSaver.load_model(multi_args.pa_ckpt_path, gpu_ids, model_args, data_args)
@@ -172,10 +204,11 @@ def load_multi_model(multi_args, model_args, data_args, gpu_ids):
     return model
 
 
-def write_results(dataset_name, split, eval_metrics, metrics, output_path, name, ckpt_info, evaluate_task_sequence):
-    """Write model performance to a CSV file."""
+def write_results(dataset_name, split, eval_metrics, metrics, output_path, name, ckpt_info, eval_tasks):
+    """Write model performance to a CSV file.
 
-    eval_tasks = TASK_SEQUENCES[evaluate_task_sequence]
+    `eval_tasks` is the task sequence whose tasks get a column for each metric.
+    """
 
     # Create the columns
     cols = ['name', 'dataset', 'epoch']
@@ -183,22 +216,21 @@ def write_results(dataset_name, split, eval_metrics, metrics, output_path, name,
         for task in eval_tasks:
             cols.append(task + metric)
 
+    prefix = f'{dataset_name}-{split}_'
     row = {'name': name,
            'dataset': dataset_name,
            'epoch': ckpt_info['epoch'],
-           f'{split}_loss': metrics[dataset_name + f'-{split}_loss'],
-           'weighted_loss': metrics[dataset_name + f'-{split}_weighted_loss']}
-
-    for col in cols[3:]:
-        if (dataset_name + f'-{split}_' + col) in metrics:
-            row[col] = metrics[dataset_name + f'-{split}_' + col]
-        else:
-            row[col] = NAN
+           f'{split}_loss': metrics[prefix + 'loss'],
+           'weighted_loss': metrics[prefix + 'weighted_loss']}
+    row.update({col: metrics.get(prefix + col, NAN) for col in cols[3:]})
 
     print(f"Writing scores to {output_path}")
-    results = pd.DataFrame(row, index=[0])
-
-    results.to_csv(output_path, index=False)
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        writer.writeheader()
+        # Missing values are written as empty fields, like DataFrame.to_csv does
+        writer.writerow({col: '' if isinstance(val, float) and math.isnan(val) else val
+                         for col, val in row.items()})
 
 def write_model_paths(results_dir, ckpt_path, ckpt_paths):
     filename = os.path.join(results_dir, 'models.txt')
@@ -212,6 +244,10 @@ def write_model_paths(results_dir, ckpt_path, ckpt_paths):
 
 
 if __name__ == '__main__':
-    torch.multiprocessing.set_sharing_strategy('file_system')
+    from args import TestArgParser
     parser = TestArgParser()
-    test(parser.parse_args())
+    args = parser.parse_args()
+
+    import torch
+    torch.multiprocessing.set_sharing_strategy('file_system')
+    test(args)
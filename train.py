@@ -79,14 +79,18 @@ def train(args):
                               is_training=True,
                               shuffle=True,
                               covar_list=model_args.covar_list,
-                              fold_num=data_args.fold_num)
+                              fold_num=data_args.fold_num,
+                              num_workers=args.num_workers,
+                              prefetch_factor=args.prefetch_factor)
     eval_loaders = get_eval_loaders(data_args,
                                     transform_args,
                                     task_sequence,
                                     args.batch_size,
                                     frontal_lateral=model_args.frontal_lateral,
                                     covar_list=model_args.covar_list,
-                                    fold_num=data_args.fold_num)
+                                    fold_num=data_args.fold_num,
+                                    num_workers=args.num_workers,
+                                    prefetch_factor=args.prefetch_factor)
     class_weights = train_loader.dataset.class_weights
 
     # Get loss functions
@@ -1,5 +1,4 @@
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 import scipy.ndimage.interpolation as interpolate
 import torch
@@ -258,6 +257,9 @@ def add_heat_map(original_image, intensities_np, alpha_img=0.33, color_map='magm
     """
     assert(np.max(intensities_np) <= 1 and np.min(intensities_np) >= 0)
     assert(np.max(original_image) <= 1 and np.min(original_image) >= 0), f'np.max: {np.max(original_image)} and np.min: {np.min(original_image)}'
+    # Imported here so that importing util does not load matplotlib. Only a color map
+    # is needed (nothing is drawn), so the backend is left to the caller.
+    import matplotlib.pyplot as plt
     color_map_fn = plt.get_cmap(color_map)
 
 
@@ -1,5 +1,9 @@
+import torch
 import torch.nn.functional as F
 
+# inference_mode needs torch >= 1.9; fall back to no_grad on older versions
+INFERENCE_MODE = getattr(torch, 'inference_mode', torch.no_grad)
+
 
 def uncertain_logits_to_probs(logits):
     """Convert explicit uncertainty modeling logits to probabilities P(is_abnormal).